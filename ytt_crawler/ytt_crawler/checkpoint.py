@@ -0,0 +1,216 @@
+"""
+Module for persisting crawler state, so that a crashed crawler can pick up
+where it left off instead of restarting from the seed.
+
+Items are recorded as in-progress when they are received and marked as
+completed (together with the counters they contribute to) after their results
+are written to the database; enqueued channels are recorded in the frontier.
+All of these are appended to a journal (one small JSON line each) and synced
+before returning, so the per-item cost does not depend on how much has been
+crawled.
+
+The full state is periodically compacted into a snapshot. The journal is
+first rotated out under the lock, and the snapshot is written without holding
+it, so recording items is never blocked on a large snapshot. Journal entries
+are numbered, and the snapshot stores the last number it includes, so entries
+are never applied twice if the crawler stops part way through a compaction.
+
+On resume, the snapshot is loaded and the journals replayed on top of it;
+in-progress items are then reprocessed and completed items are skipped.
+"""
+
+import os
+import json
+import asyncio
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any
+
+from pydantic import BaseModel
+
+
+class CheckpointExistsException(Exception):
+    def __init__(self, path):
+        super().__init__(
+            f"Checkpoint '{path}' already exists; run with --resume to continue "
+            "from it, or remove it to start a new crawl"
+        )
+
+
+class CrawlCheckpoint:
+    def __init__(self, path: str):
+        self._path = path
+        self._journal_path = path + '.journal'
+        self._compacting_path = path + '.journal.compacting'
+        self._journal = None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._dirty = False
+
+        self.frontier: set = set()
+        self.in_progress: Dict[str, Dict[str, str]] = {'channels': {}, 'videos': {}}
+        self.completed: Dict[str, set] = {'channels': set(), 'videos': set()}
+        self.watermark: str | None = None
+        self.counters: Dict[str, int] = {}
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return any(os.path.exists(p) for p in
+                   (path, path + '.journal', path + '.journal.compacting'))
+
+    @classmethod
+    def load(cls, path: str) -> 'CrawlCheckpoint':
+        checkpoint = cls(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+
+            checkpoint.frontier = set(state['frontier'])
+            checkpoint.in_progress = state['in_progress']
+            checkpoint.completed = {k: set(v) for k, v in state['completed'].items()}
+            checkpoint.watermark = state['watermark']
+            checkpoint.counters = state['counters']
+            checkpoint._seq = state.get('seq', 0)
+
+        # A journal left over from an unfinished compaction comes first
+        for journal_path in (checkpoint._compacting_path, checkpoint._journal_path):
+            if os.path.exists(journal_path):
+                checkpoint._replay(journal_path)
+        return checkpoint
+
+    def _replay(self, journal_path: str):
+        with open(journal_path, 'rb+') as f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partially written last line from a crash, cut it off
+                    # so that new entries are not appended after it
+                    f.truncate(offset)
+                    break
+                # Entries up to the snapshot's number are already in it
+                if entry['seq'] > self._seq:
+                    self._apply(entry)
+                    self._seq = entry['seq']
+                offset += len(line)
+
+    # State updates
+
+    def _apply(self, entry: Dict[str, Any]):
+        if entry['op'] == 'frontier':
+            self.frontier.add(entry['key'])
+            return
+
+        kind, key = entry['kind'], entry['key']
+        if entry['op'] == 'begin':
+            self.in_progress[kind][key] = entry['payload']
+        elif entry['op'] == 'complete':
+            self.in_progress[kind].pop(key, None)
+            self.completed[kind].add(key)
+            self.watermark = entry['ts']
+            for counter, n in entry['counters'].items():
+                self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def _append(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._seq += 1
+            entry['seq'] = self._seq
+            self._apply(entry)
+            if self._journal is None:
+                self._journal = open(self._journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(entry) + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._dirty = True
+
+    def begin(self, kind: str, key: str, payload: BaseModel):
+        """
+        Durably records an item as received. This does blocking I/O, so call
+        it from a worker thread when on the event loop.
+        """
+        self._append({'op': 'begin', 'kind': kind, 'key': key,
+                      'payload': payload.model_dump_json()})
+
+    def complete(self, kind: str, key: str, **counters: int):
+        """
+        Durably records an item as completed, adding `counters` to the crawl
+        counters. Only acknowledge the item to the queue after this returns.
+        """
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        counters = {f'{kind}_completed': 1, **counters}
+        self._append({'op': 'complete', 'kind': kind, 'key': key, 'ts': ts,
+                      'counters': counters})
+
+    def is_completed(self, kind: str, key: str) -> bool:
+        return key in self.completed[kind]
+
+    def add_frontier(self, channel_handle: str):
+        """
+        Durably records a channel as enqueued. Blocking, like `begin`.
+        """
+        self._append({'op': 'frontier', 'key': channel_handle})
+
+    def in_frontier(self, channel_handle: str) -> bool:
+        return channel_handle in self.frontier
+
+    # Persistence
+
+    def compact(self):
+        """
+        Atomically writes the full state to the snapshot file, by writing to a
+        temporary file in the same directory and renaming it over the previous
+        snapshot, then removes the journal entries it includes.
+        """
+        # Only copying the state and rotating the journal happen under the
+        # lock; sorting and writing the (large) snapshot happen outside of it
+        with self._lock:
+            state = {
+                'frontier': set(self.frontier),
+                'in_progress': {k: dict(v) for k, v in self.in_progress.items()},
+                'completed': {k: set(v) for k, v in self.completed.items()},
+                'watermark': self.watermark,
+                'counters': dict(self.counters),
+                'seq': self._seq,
+            }
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self._journal_path):
+                if os.path.exists(self._compacting_path):
+                    # Left over from an unfinished compaction; its entries
+                    # are in the state as well, so merge the two
+                    with open(self._compacting_path, 'a', encoding='utf-8') as dst, \
+                            open(self._journal_path, 'r', encoding='utf-8') as src:
+                        dst.write(src.read())
+                    os.unlink(self._journal_path)
+                else:
+                    os.replace(self._journal_path, self._compacting_path)
+            self._dirty = False
+
+        state['frontier'] = sorted(state['frontier'])
+        state['completed'] = {k: sorted(v) for k, v in state['completed'].items()}
+
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            os.unlink(tmp_path)
+            # The rotated journal is kept, and merged on the next attempt
+            self._dirty = True
+            raise
+
+        if os.path.exists(self._compacting_path):
+            os.unlink(self._compacting_path)
+
+    async def run_periodic(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if self._dirty:
+                await asyncio.to_thread(self.compact)
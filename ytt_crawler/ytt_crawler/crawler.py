@@ -7,58 +7,120 @@ will interface with the pub-sub tool as a queue for the BFS.
 """
 
 import os
+import time
+import logging
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
-from typing import Iterable, List, Tuple, Dict, Any
+from typing import Iterable, List, Tuple, Dict, Any, AsyncIterator
 import json
 import asyncio
-import cachetools
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from ytt_crawler.pubsub import MosquittoQueue
+from ytt_crawler.checkpoint import CrawlCheckpoint, CheckpointExistsException
+from ytt_crawler.resolver import ChannelIndex
+from ytt_crawler.events import log_event, setup_logging, dropped_counts
 from ytt_scraper import handler as ytt
+from ytt_scraper import youtube
 from ytt_scraper import ner
+from ytt_scraper.config import get_api_concurrency_config
+from ytt_scraper.schema import VideoRecord
 from ytt_database.schema import ChannelDetails, VideoDetails
 from ytt_database.handler import YttDatabase
 
 
+logger = logging.getLogger(__name__)
+
 TOPIC_DESERIALIZER = {
     'source/channels': ChannelDetails.model_validate_json,
     'source/videos': VideoDetails.model_validate_json,
 }
 
+# API calls run in worker threads so that they can overlap; how many run at
+# once is decided by the adaptive limiter in `ytt_scraper.youtube`. They get
+# their own pool, sized to the limiter's maximum, so that the pool is never
+# what caps concurrency and other blocking work cannot starve it
+
+@functools.lru_cache(maxsize=None)
+def _get_api_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=get_api_concurrency_config()['max_limit'],
+        thread_name_prefix='ytt-api'
+    )
+
+async def _run_api_call(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_api_executor(), fn, *args)
+
 async def _async_get_channel_details(channel_handle: str):
-    return ytt.get_channel_details(channel_handle)
+    return await _run_api_call(ytt.get_channel_details, channel_handle)
 
 async def _async_get_video_from_video_id(video_id: str):
-    return ytt.get_video_from_video_id(video_id)
+    return await _run_api_call(ytt.get_video_from_video_id, video_id)
 
 async def _async_get_videos_from_channel_id(video_id: str):
-    return ytt.get_videos_from_channel_id(video_id)
+    return await _run_api_call(ytt.get_videos_from_channel_id, video_id)
+
+async def _async_iter_video_pages_from_channel_id(channel_id: str,
+                                                  max_pages: int = None
+                                                  ) -> AsyncIterator[List[VideoRecord]]:
+    pages = ytt.iter_video_pages_from_channel_id(channel_id, max_pages)
+    while (page := await _run_api_call(next, pages, None)) is not None:
+        yield page
 
 async def _async_get_videos_from_playlist_id(video_id: str):
-    return ytt.get_videos_from_playlist_id(video_id)
+    return await _run_api_call(ytt.get_videos_from_playlist_id, video_id)
 
 
 class BFSCrawler():
     def __init__(self,
                  start_channel: str,
                  queue_host: str,
-                 queue_port: int = 1883):
+                 queue_port: int = 1883,
+                 resume: bool = False):
         self._start_channel = start_channel
-        self._queue = MosquittoQueue(queue_host, queue_port, TOPIC_DESERIALIZER)
-        self._ner_model = ner.model.RegexBasedParserModel(
-            classes=["VOCALIST_REF"]
+        self._resume = resume
+        self._queue = MosquittoQueue(
+            queue_host, queue_port, TOPIC_DESERIALIZER,
+            client_id=os.environ.get('CRAWLER_CLIENT_ID', 'ytt-crawler')
+        )
+        self._ner_model = ner.registry.get_model(
+            'regex', classes=["VOCALIST_REF"]
         )
+        if 'NER_CACHE_PATH' in os.environ:
+            self._ner_model = ner.cache.CachedNERModel(
+                self._ner_model,
+                ner.cache.NERCache(
+                    os.environ['NER_CACHE_PATH'],
+                    max_entries=int(os.environ.get('NER_CACHE_MAX_ENTRIES', 100_000))
+                )
+            )
 
         self._wait_times = {}
         self._wait_times['seed'] = int(os.environ.get('CRAWLER_SEED_WAIT_TIME', 1))
-        self._wait_times['channel_id'] = int(os.environ.get('CRAWLER_CHANNEL_ID_WAIT_TIME', 21))
-        self._wait_times['video_id'] = int(os.environ.get('CRAWLER_VIDEO_ID_WAIT_TIME', 5))
 
-        # 128 entries, 10 minutes
-        self._channel_ttl_cache = cachetools.TTLCache(maxsize=128, ttl=10 * 60)
+        # Items processed at once per subscription. The request rate itself is
+        # paced by the API concurrency limiter, these only bound the work
+        # (and unacknowledged messages) in flight
+        self._max_concurrency = {}
+        self._max_concurrency['channels'] = int(os.environ.get('CRAWLER_MAX_CONCURRENT_CHANNELS', 4))
+        self._max_concurrency['videos'] = int(os.environ.get('CRAWLER_MAX_CONCURRENT_VIDEOS', 16))
+
+        # 0 crawls the full catalogue of each channel
+        self._max_channel_pages = int(os.environ.get('CRAWLER_MAX_CHANNEL_PAGES', 1)) or None
+
+        # Keys currently being processed, so that a redelivered message for
+        # an item which is still in progress is not processed twice
+        self._in_flight = {'channels': set(), 'videos': set()}
+
+        self._checkpoint_interval = int(os.environ.get('CRAWLER_CHECKPOINT_INTERVAL', 30))
+        self.setup_checkpoint(
+            os.environ.get('CRAWLER_CHECKPOINT_PATH', 'crawler_checkpoint.json')
+        )
 
         self.setup_db()
 
@@ -67,110 +129,269 @@ class BFSCrawler():
 
     def setup_db(self):
         self._db = YttDatabase()
-        
+        self._channel_index = ChannelIndex.from_db(self._db)
+        log_event(logger, 'channel_index_loaded', stage='setup',
+                  n_channels=len(self._channel_index))
+
+    def setup_checkpoint(self, checkpoint_path: str):
+        if self._resume:
+            self._checkpoint = CrawlCheckpoint.load(checkpoint_path)
+            # Unfinished items are replayed from the checkpoint, and the broker
+            # also redelivers their unacknowledged messages; the replay wins
+            for kind, items in self._checkpoint.in_progress.items():
+                self._in_flight[kind].update(items)
+        else:
+            if CrawlCheckpoint.exists(checkpoint_path):
+                raise CheckpointExistsException(checkpoint_path)
+            self._checkpoint = CrawlCheckpoint(checkpoint_path)
+
     # Async
 
     async def __async__run(self):
+        start = self._async_replay_in_progress() if self._resume \
+            else self._async_seed_queue()
         await asyncio.gather(
-            self._async_seed_queue(),
+            start,
+            self._checkpoint.run_periodic(self._checkpoint_interval),
+            self._async_flush_stats_periodic(),
+            self._async_report_api_concurrency(),
             self._async_crawl_channel_for_videos(),
             self._async_crawl_video_for_vocalists()
         )
 
+    async def _async_flush_stats_periodic(self):
+        while True:
+            await asyncio.sleep(self._checkpoint_interval)
+            self._db.flush_stats()
+
+    async def _async_report_api_concurrency(self):
+        while True:
+            await asyncio.sleep(self._checkpoint_interval)
+            log_event(logger, 'api_concurrency', stage='api',
+                      **youtube.get_limiter().stats())
+            # So that a sampled or lossy log shows how much it is missing
+            log_event(logger, 'log_dropped', stage='logging', **dropped_counts())
+
     # Publishing
 
     async def _async_enqueue_video(self, video: VideoDetails):
-        print(f"-> Enqueueing {video.title}...")
+        log_event(logger, 'video_enqueued', stage='enqueue',
+                  video_id=video.video_id, channel_id=video.channel_id)
         await self._queue.publish('source/videos', video)
 
-    async def _async_enqueue_channel(self, channel_handle: str):
-        if ((channel_handle in self._channel_ttl_cache)
-            or (self._db.get_channel_by_handle(channel_handle) is None)):
-            print(f"{channel_handle} already enqueued, skipping")
-        print(f"-> Enqueueing {channel_handle}...")
+    async def _async_enqueue_channel(self,
+                                     channel_handle: str,
+                                     force: bool = False) -> ChannelDetails | None:
         payload = await _async_get_channel_details(channel_handle)
         if not payload:
-            print(f"{channel_handle} yielded no results, not enqueueing")
-            return
+            log_event(logger, 'channel_not_found', stage='enqueue',
+                      channel_handle=channel_handle)
+            return None
+
+        # The reference may be a new variant of a channel we already know
+        known = self._channel_index.has_channel(payload.channel_id)
+        self._channel_index.add(payload, alias=channel_handle)
+        if not force and (known or self._checkpoint.in_frontier(channel_handle)):
+            log_event(logger, 'channel_already_enqueued', stage='enqueue',
+                      channel_handle=channel_handle, channel_id=payload.channel_id)
+            return payload
+
+        log_event(logger, 'channel_enqueued', stage='enqueue',
+                  channel_handle=channel_handle, channel_id=payload.channel_id)
         await self._queue.publish('source/channels', payload)
-        self._channel_ttl_cache[channel_handle] = 1
+        await asyncio.to_thread(self._checkpoint.add_frontier, channel_handle)
+        return payload
 
     async def _async_seed_queue(self):
         await asyncio.sleep(self._wait_times['seed'])
-        await self._async_enqueue_channel(self._start_channel)
+        await self._async_enqueue_channel(self._start_channel, force=True)
+
+    async def _async_replay_in_progress(self):
+        """
+        Reprocesses items which were received but not completed before the
+        previous run stopped.
+        """
+        channels = list(self._checkpoint.in_progress['channels'].values())
+        videos = list(self._checkpoint.in_progress['videos'].values())
+        log_event(logger, 'resume', stage='setup',
+                  n_channels=len(channels), n_videos=len(videos))
+
+        for payload in channels:
+            channel = TOPIC_DESERIALIZER['source/channels'](payload)
+            try:
+                await self._async_process_channel(channel)
+            finally:
+                self._in_flight['channels'].discard(channel.channel_id)
+        for payload in videos:
+            video = TOPIC_DESERIALIZER['source/videos'](payload)
+            try:
+                await self._async_process_video(video)
+            finally:
+                self._in_flight['videos'].discard(video.video_id)
 
     # Processing
 
     def _extract_vocalists_from_video(self, video: VideoDetails):
+        start = time.perf_counter()
         entities = self._ner_model.extract_entities(video.cleaned_text)
-        print(entities)
+        log_event(logger, 'entities_extracted', logging.DEBUG, stage='ner',
+                  video_id=video.video_id, entities=entities,
+                  duration_ms=(time.perf_counter() - start) * 1000)
         vocalists = self._ner_model.get_entities(entities, 'VOCALIST_REF')
         return vocalists
 
     # Subscribing / Crawling
 
-    async def _async_crawl_channel_for_videos(self):
-        channels = self._queue.subscribe('source/channels')
-        async for channel in channels:
-            print(f"Received channel {channel.handle} from queue, getting channel videos...")
-            await self._async_insert_channel_to_db(channel)
+    async def _async_crawl(self, topic: str, kind: str, stage: str, get_key, process):
+        """
+        Processes messages from a subscription concurrently, up to the limit
+        for `kind`. Messages are only acknowledged once completed in the
+        checkpoint, so the broker redelivers anything that was not finished
+        before a crash. A failing item stops the crawler, as it would when
+        processing one item at a time.
+        """
+        semaphore = asyncio.Semaphore(self._max_concurrency[kind])
+        in_flight = self._in_flight[kind]
+
+        async def _process_and_ack(key, item, ack):
+            try:
+                await process(item)
+                ack()
+            finally:
+                in_flight.discard(key)
+                semaphore.release()
+
+        async with asyncio.TaskGroup() as tasks:
+            async for item, ack in self._queue.subscribe_with_ack(topic):
+                key = get_key(item)
+                # Duplicates of an item being processed are acknowledged right
+                # away; if processing fails, the checkpoint still has the item
+                # in progress and it is replayed on resume
+                if self._checkpoint.is_completed(kind, key):
+                    log_event(logger, f'{stage}_already_crawled', stage=stage,
+                              **{f'{stage}_id': key})
+                    ack()
+                    continue
+                if key in in_flight:
+                    log_event(logger, f'{stage}_already_in_progress', stage=stage,
+                              **{f'{stage}_id': key})
+                    ack()
+                    continue
+                in_flight.add(key)
+                await semaphore.acquire()
+                tasks.create_task(_process_and_ack(key, item, ack))
 
-            videos = await _async_get_videos_from_channel_id(channel.channel_id)
+    async def _async_crawl_channel_for_videos(self):
+        await self._async_crawl(
+            'source/channels', 'channels', 'channel',
+            lambda channel: channel.channel_id,
+            self._async_process_channel
+        )
 
-            clean_videos: List[VideoDetails] = \
-                [ner.preprocess.clean_video(v) for v in videos]
-            filtered_videos: List[VideoDetails] = \
-                ner.preprocess.filter_videos(clean_videos)
-            print(f"Obtained {len(videos)}->{len(filtered_videos)} videos from {channel.handle}, enqueueing...")
+    async def _async_process_channel(self, channel: ChannelDetails):
+        await asyncio.to_thread(
+            self._checkpoint.begin, 'channels', channel.channel_id, channel)
+        start = time.perf_counter()
+        log_event(logger, 'channel_received', stage='channel',
+                  channel_id=channel.channel_id, channel_handle=channel.handle)
+        await self._async_insert_channel_to_db(channel)
+        self._channel_index.add(channel)
+
+        # Videos are processed one page at a time, so memory use does not
+        # depend on the size of the channel's catalogue
+        n_videos, n_filtered = 0, 0
+        pages = _async_iter_video_pages_from_channel_id(
+            channel.channel_id, self._max_channel_pages)
+        async for page in pages:
+            n_videos += len(page)
+            filtered_videos: List[VideoRecord] = ner.preprocess.filter_videos(
+                map(ner.preprocess.clean_record, page)
+            )
+            del page
+            n_filtered += len(filtered_videos)
+
+            # Records are validated once, and the result is reused for both
+            # the DB insert and the queue
+            video_details = [v.to_details() for v in filtered_videos]
+            del filtered_videos
 
             for future in asyncio.as_completed(map(
                 self._async_insert_video_to_db,
-                filtered_videos
+                video_details
             )):
                 await future
 
+            # The description is only stored, the NER stage only needs the
+            # cleaned text
+            for v in video_details:
+                v.description = ''
+
             for future in asyncio.as_completed(map(
                 self._async_enqueue_video,
-                filtered_videos
+                video_details
             )):
                 await future
 
-            await asyncio.sleep(self._wait_times['channel_id'])
+        log_event(logger, 'channel_processed', stage='channel',
+                  channel_id=channel.channel_id, n_videos=n_videos,
+                  n_filtered=n_filtered,
+                  duration_ms=(time.perf_counter() - start) * 1000)
 
+        await asyncio.to_thread(
+            self._checkpoint.complete, 'channels', channel.channel_id,
+            videos_enqueued=n_filtered)
 
     async def _async_crawl_video_for_vocalists(self):
-        videos = self._queue.subscribe('source/videos')
-        async for video in videos:
-            print(f"Received video {video.title} from queue, extracting vocalists...")
-            vocalists = self._extract_vocalists_from_video(video)
-            print(f"{len(vocalists)} vocalist/s detected, enqueueing...")
-
-            for future in asyncio.as_completed(map(
-                self._async_enqueue_channel,
-                vocalists.keys()
-            )):
-                await future
-
-            vocalist_details = [
-                await future
-                for future in asyncio.as_completed(map(
-                    _async_get_channel_details,
-                    vocalists.keys()
-                ))
-            ]
-
-            vocalist_edges = [
-                (video.video_id, vd.channel_id)
-                for vd in vocalist_details
-                if vd
-            ]
-            for future in asyncio.as_completed(map(
-                self._async_insert_vocalist_to_db,
-                vocalist_edges
-            )):
-                await future
+        await self._async_crawl(
+            'source/videos', 'videos', 'video',
+            lambda video: video.video_id,
+            self._async_process_video
+        )
 
-            await asyncio.sleep(self._wait_times['video_id'])
+    async def _async_process_video(self, video: VideoDetails):
+        await asyncio.to_thread(
+            self._checkpoint.begin, 'videos', video.video_id, video)
+        start = time.perf_counter()
+        log_event(logger, 'video_received', stage='video', video_id=video.video_id)
+        vocalists = self._extract_vocalists_from_video(video)
+
+        # Known channels are resolved locally, only unknown references are
+        # looked up (and enqueued)
+        vocalist_ids = set()
+        unknown_refs = []
+        for ref, text in vocalists.items():
+            channel_id = self._channel_index.resolve(text)
+            if channel_id is None:
+                unknown_refs.append(ref)
+            else:
+                vocalist_ids.add(channel_id)
+
+        for future in asyncio.as_completed(map(
+            self._async_enqueue_channel,
+            unknown_refs
+        )):
+            vd = await future
+            if vd:
+                vocalist_ids.add(vd.channel_id)
+
+        vocalist_edges = [
+            (video.video_id, channel_id)
+            for channel_id in vocalist_ids
+        ]
+        for future in asyncio.as_completed(map(
+            self._async_insert_vocalist_to_db,
+            vocalist_edges
+        )):
+            await future
+
+        log_event(logger, 'video_processed', stage='video',
+                  video_id=video.video_id, n_refs=len(vocalists),
+                  n_unknown_refs=len(unknown_refs), n_vocalists=len(vocalist_edges),
+                  duration_ms=(time.perf_counter() - start) * 1000)
+
+        await asyncio.to_thread(
+            self._checkpoint.complete, 'videos', video.video_id,
+            vocalist_edges=len(vocalist_edges))
 
     # Inserting to DB (will be replaced perhaps)
 
@@ -185,8 +406,18 @@ class BFSCrawler():
 
 
 def main():
-    print("Running crawler...", flush=True)
-    crawler = BFSCrawler('Soshi', 'localhost')
+    parser = argparse.ArgumentParser(description='Run the BFS cover crawler')
+    parser.add_argument('--seed', default='Soshi',
+                        help='channel handle to start crawling from')
+    parser.add_argument('--queue-host', default='localhost')
+    parser.add_argument('--resume', action='store_true',
+                        help='resume from the last checkpoint instead of seeding')
+    args = parser.parse_args()
+
+    setup_logging()
+    log_event(logger, 'crawler_started', stage='setup',
+              seed=args.seed, resume=args.resume)
+    crawler = BFSCrawler(args.seed, args.queue_host, resume=args.resume)
     crawler.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""
+Module for structured, non-blocking event logging in the crawler.
+
+Log calls only put the record on an in-memory queue; formatting to JSON lines
+and writing to the output happens on a background thread, so the event loop is
+never blocked on stdout. Records are sampled and rate limited per event type
+before they are queued, and dropped (and counted) if the queue is full.
+
+Events are emitted through the standard `logging` module, with the event type
+and its fields passed as `extra`, e.g.
+
+    log_event(logger, 'channel_received', stage='channel', channel_id=...)
+
+so `ytt_scraper` and `ytt_database` can log with plain `logging` calls and
+still be captured here.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import threading
+from collections import Counter
+from typing import Any, Dict, Tuple
+
+LOGGER_NAMES = ('ytt_crawler', 'ytt_scraper', 'ytt_database')
+
+# Attributes every LogRecord has, anything else came in through `extra`
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'taskName'}
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'event': event, **fields})
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+        }
+        if payload['event'] is None or record.msg != payload['event']:
+            payload['msg'] = record.getMessage()
+        payload.update({
+            k: v for k, v in record.__dict__.items()
+            if k not in _RECORD_ATTRS and k != 'event'
+        })
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Per-event-type sampling (keep a fraction of records) and rate limiting
+    (token bucket, records per second). Warnings and errors are never dropped.
+    """
+    def __init__(self,
+                 sample_rates: Dict[str, float] = None,
+                 rate_limits: Dict[str, float] = None):
+        super().__init__()
+        self._sample_rates = sample_rates or {}
+        self._rate_limits = rate_limits or {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.dropped = Counter()
+
+    def _take_token(self, event: str, rate: float) -> bool:
+        # The bucket holds at least one token, so that rates below 1/s still
+        # let a record through every 1/rate seconds
+        capacity = max(1.0, rate)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(event, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            if tokens < 1:
+                self._buckets[event] = (tokens, now)
+                return False
+            self._buckets[event] = (tokens - 1, now)
+            return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        event = getattr(record, 'event', record.name)
+        sample_rate = self._sample_rates.get(event)
+        if sample_rate is not None and random.random() >= sample_rate:
+            self.dropped[event] += 1
+            return False
+
+        rate_limit = self._rate_limits.get(event)
+        if rate_limit is not None and not self._take_token(event, rate_limit):
+            self.dropped[event] += 1
+            return False
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler which drops records instead of blocking or raising when the
+    queue is full.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Set up by `setup_logging`, for reporting dropped records
+_queue_handler: DroppingQueueHandler | None = None
+_sampling_filter: SamplingFilter | None = None
+
+
+def dropped_counts() -> Dict[str, Any]:
+    """
+    Returns how many records were dropped so far: by sampling and rate limits
+    (per event type), and because the queue was full.
+    """
+    if _queue_handler is None:
+        return {}
+    return {
+        'queue_full': _queue_handler.dropped,
+        'filtered': dict(_sampling_filter.dropped),
+    }
+
+
+def _parse_event_rates(spec: str) -> Dict[str, float]:
+    """
+    Parses 'event=value,event=value' configuration strings
+    """
+    rates = {}
+    for item in filter(None, spec.split(',')):
+        event, value = item.split('=')
+        rates[event.strip()] = float(value)
+    return rates
+
+
+def setup_logging(stream=sys.stdout, level: int = logging.INFO,
+                  sample_rates: Dict[str, float] = None,
+                  rate_limits: Dict[str, float] = None,
+                  max_queue_size: int = 10000) -> logging.handlers.QueueListener:
+    """
+    Routes the crawler, scraper and database loggers through a bounded queue
+    to a background thread writing JSON lines. Sampling and rate limits default
+    to the CRAWLER_LOG_SAMPLE_RATES and CRAWLER_LOG_RATE_LIMITS environment
+    variables, formatted as 'event=value,event=value'.
+    """
+    if sample_rates is None:
+        sample_rates = _parse_event_rates(os.environ.get('CRAWLER_LOG_SAMPLE_RATES', ''))
+    if rate_limits is None:
+        rate_limits = _parse_event_rates(os.environ.get('CRAWLER_LOG_RATE_LIMITS', ''))
+
+    output_handler = logging.StreamHandler(stream)
+    output_handler.setFormatter(JsonLinesFormatter())
+
+    global _queue_handler, _sampling_filter
+
+    log_queue = queue.Queue(maxsize=max_queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    sampling_filter = SamplingFilter(sample_rates, rate_limits)
+    queue_handler.addFilter(sampling_filter)
+    _queue_handler, _sampling_filter = queue_handler, sampling_filter
+
+    for name in LOGGER_NAMES:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, output_handler)
+    listener.start()
+
+    # Flush whatever is still queued on exit, unless already stopped
+    def _stop_listener():
+        if listener._thread is not None:
+            listener.stop()
+
+    atexit.register(_stop_listener)
+    return listener
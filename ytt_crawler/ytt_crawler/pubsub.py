@@ -4,9 +4,10 @@ simple as a MQTT queue like Mosquitto, or a full-fledged Kafka cluster.
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Callable, AsyncIterator
+from typing import List, Dict, Any, Callable, AsyncIterator, Tuple
 import json
 import asyncio
+import collections
 
 import aiomqtt
 from pydantic import BaseModel
@@ -38,21 +39,83 @@ class MosquittoQueue(PubsubQueue):
     def __init__(self,
                  host: str,
                  port: int,
-                 topic_deserializer: Dict[str, Callable]
+                 topic_deserializer: Dict[str, Callable],
+                 qos: int = 1,
+                 client_id: str = None
                  ):
         super().__init__(host, port)
         self._topic_deserializer = topic_deserializer
+        self._qos = qos
+        self._client_id = client_id
 
     async def publish(self, topic: str, payload: BaseModel):
         payload_ser = payload.model_dump_json()
         async with aiomqtt.Client(self._host, self._port) as client:
-            await client.publish(topic, payload=payload_ser)
+            await client.publish(topic, payload=payload_ser, qos=self._qos)
+
+    def _make_client(self, topic: str) -> aiomqtt.Client:
+        # With a fixed client ID, the broker keeps a persistent session and
+        # holds QoS 1 messages for us while the subscriber is down
+        session_kwargs = {}
+        if self._client_id is not None:
+            session_kwargs['identifier'] = f'{self._client_id}-{topic}'
+            session_kwargs['clean_session'] = False
+        return aiomqtt.Client(self._host, self._port, **session_kwargs)
 
     async def subscribe(self, topic: str) -> AsyncIterator[BaseModel]:
         if topic not in self._topic_deserializer:
             raise MissingDeserializerException(topic)
 
-        async with aiomqtt.Client(self._host, self._port) as client:
-            await client.subscribe(topic)
+        async with self._make_client(topic) as client:
+            await client.subscribe(topic, qos=self._qos)
             async for message in client.messages:
                 yield self._topic_deserializer[topic](message.payload)
+
+    async def subscribe_with_ack(self, topic: str) -> AsyncIterator[Tuple[BaseModel, Callable]]:
+        """
+        Like `subscribe`, but yields each payload together with an `ack`
+        callable. Messages are only acknowledged to the broker once `ack` is
+        called, so anything unacknowledged is redelivered after a crash.
+        """
+        if topic not in self._topic_deserializer:
+            raise MissingDeserializerException(topic)
+
+        client = self._make_client(topic)
+        # aiomqtt does not expose paho's manual acknowledgement, so it is
+        # switched on directly on the underlying paho client
+        client._client.manual_ack_set(True)
+        acker = OrderedAcker(client._client)
+
+        async with client:
+            await client.subscribe(topic, qos=self._qos)
+            async for message in client.messages:
+                yield (self._topic_deserializer[topic](message.payload),
+                       acker.track(message.mid, message.qos))
+
+
+class OrderedAcker:
+    """
+    Sends acknowledgements in the order messages were received (as required
+    by MQTT), even if messages finish processing out of order.
+    """
+    def __init__(self, paho_client):
+        self._paho_client = paho_client
+        self._pending = collections.OrderedDict()
+
+    def track(self, mid: int, qos: int) -> Callable:
+        token = object()
+        self._pending[token] = [mid, qos, False]
+
+        def ack():
+            self._pending[token][2] = True
+            self._flush()
+        return ack
+
+    def _flush(self):
+        while self._pending:
+            token, (mid, qos, done) = next(iter(self._pending.items()))
+            if not done:
+                return
+            del self._pending[token]
+            if qos > 0:
+                self._paho_client.ack(mid, qos)
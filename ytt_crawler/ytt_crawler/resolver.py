@@ -0,0 +1,65 @@
+"""
+Module for resolving channel references to channel IDs without calling the
+Youtube API. An in-memory index maps every known handle, reference alias and
+title (normalized) to its channel ID, so only references which are truly
+unknown need an API lookup.
+
+Titles are not unique, so a title is only resolved locally while exactly one
+known channel has it; once a second channel with the same title is seen, the
+title is marked as ambiguous and references to it go to the API again.
+References which are explicitly handles, URLs or channel IDs (see
+`normalize.is_handle_reference`) are never matched against titles; only free
+text references, which only the transformer models produce, can be.
+"""
+
+from typing import Dict, Any
+
+from ytt_scraper.ner.normalize import normalize_reference, is_handle_reference
+from ytt_database.schema import ChannelDetails
+
+
+class ChannelIndex:
+    def __init__(self):
+        self._refs: Dict[str, str] = {}
+        # Ambiguous titles map to None
+        self._titles: Dict[str, str | None] = {}
+        self._channel_ids: set = set()
+
+    @classmethod
+    def from_db(cls, db) -> 'ChannelIndex':
+        index = cls()
+        for doc in db.iter_channels():
+            index.add_document(doc)
+        return index
+
+    def __len__(self):
+        return len(self._channel_ids)
+
+    def _add(self, channel_id: str, handle: str, title: str = None,
+             alias: str = None):
+        self._channel_ids.add(channel_id)
+        self._refs[channel_id] = channel_id
+        for ref in (handle, alias):
+            if ref and (key := normalize_reference(ref)):
+                self._refs[key] = channel_id
+        if title and (key := normalize_reference(title)):
+            if self._titles.setdefault(key, channel_id) != channel_id:
+                self._titles[key] = None
+
+    def add(self, channel: ChannelDetails, alias: str = None):
+        self._add(channel.channel_id, channel.handle, channel.title, alias=alias)
+
+    def add_document(self, doc: Dict[str, Any]):
+        self._add(doc['_key'], doc.get('handle'), doc.get('title'))
+
+    def has_channel(self, channel_id: str) -> bool:
+        return channel_id in self._channel_ids
+
+    def resolve(self, ref: str) -> str | None:
+        key = normalize_reference(ref)
+        # Handles and aliases take precedence over titles
+        if key in self._refs:
+            return self._refs[key]
+        if is_handle_reference(ref):
+            return None
+        return self._titles.get(key)
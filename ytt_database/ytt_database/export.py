@@ -0,0 +1,199 @@
+# Script for exporting and importing the crawled graph
+#
+# Collections are streamed through large AQL cursor batches and written
+# batch by batch, so memory use does not grow with the size of the graph.
+#
+#   python -m ytt_database.export export ./dump --format parquet
+#   python -m ytt_database.export export ./dump --since 2024-01-01T00:00:00
+#   python -m ytt_database.export import ./dump --format parquet
+
+import os
+import gzip
+import json
+import argparse
+from itertools import islice
+from typing import Dict, Iterator, List
+
+from arango import ArangoClient
+
+
+COLLECTION_FIELDS = {
+    'channel': ['_key', 'handle', 'title', 'description',
+                'last_publish_time', 'video_count'],
+    'video': ['_key', 'publish_time', 'title', 'description', 'cleaned_text'],
+    'upload': ['_key', '_from', '_to'],
+    'vocalist': ['_key', '_from', '_to'],
+}
+
+FORMAT_EXTENSIONS = {
+    'parquet': '.parquet',
+    'jsonl': '.jsonl.gz',
+}
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def get_db(hosts='http://localhost:8529'):
+    client = ArangoClient(hosts=hosts)
+    return client.db('ytt_db', username='root', password='password')
+
+
+def _arrow_schema(coll_name):
+    import pyarrow as pa
+
+    fields = []
+    for f in COLLECTION_FIELDS[coll_name]:
+        dtype = pa.int64() if f == 'video_count' else pa.string()
+        fields.append(pa.field(f, dtype))
+    return pa.schema(fields)
+
+
+def _batched(iterable, batch_size: int) -> Iterator[List[Dict]]:
+    it = iter(iterable)
+    while batch := list(islice(it, batch_size)):
+        yield batch
+
+
+# ===== Export ===== #
+
+def stream_collection(db, coll_name: str, since: str = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """
+    Streams the documents of a collection in batches. If `since` is given,
+    only documents written at or after that timestamp are returned, using the
+    write time encoded in the document revision.
+    """
+    bind_vars = {'@coll': coll_name, 'fields': COLLECTION_FIELDS[coll_name]}
+    query = 'FOR doc IN @@coll '
+    if since is not None:
+        query += ('FILTER DATE_TIMESTAMP(DECODE_REV(doc._rev).date) '
+                  '>= DATE_TIMESTAMP(@since) ')
+        bind_vars['since'] = since
+    query += 'RETURN KEEP(doc, @fields)'
+
+    cursor = db.aql.execute(
+        query,
+        bind_vars=bind_vars,
+        batch_size=batch_size,
+        stream=True,
+        ttl=3600,
+    )
+    yield from _batched(cursor, batch_size)
+
+
+def _write_parquet(path, coll_name, batches) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(coll_name)
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def _write_jsonl(path, coll_name, batches) -> int:
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=3) as f:
+        for batch in batches:
+            f.writelines(json.dumps(doc, ensure_ascii=False) + '\n'
+                         for doc in batch)
+            count += len(batch)
+    return count
+
+
+WRITERS = {
+    'parquet': _write_parquet,
+    'jsonl': _write_jsonl,
+}
+
+
+def export_collection(db, coll_name: str, out_dir: str, fmt: str = 'parquet',
+                      since: str = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    path = os.path.join(out_dir, coll_name + FORMAT_EXTENSIONS[fmt])
+    batches = stream_collection(db, coll_name, since, batch_size)
+    return WRITERS[fmt](path, coll_name, batches)
+
+
+# ===== Import ===== #
+
+def _read_parquet(path, batch_size) -> Iterator[List[Dict]]:
+    import pyarrow.parquet as pq
+
+    # Parquet has a fixed schema, so attributes missing from a document come
+    # back as nulls; drop them so they are not imported as explicit nulls
+    parquet_file = pq.ParquetFile(path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield [
+            {k: v for k, v in doc.items() if v is not None}
+            for doc in record_batch.to_pylist()
+        ]
+
+
+def _read_jsonl(path, batch_size) -> Iterator[List[Dict]]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        docs = (json.loads(line) for line in f if line.strip())
+        yield from _batched(docs, batch_size)
+
+
+READERS = {
+    'parquet': _read_parquet,
+    'jsonl': _read_jsonl,
+}
+
+
+def import_collection(db, coll_name: str, in_dir: str, fmt: str = 'parquet',
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Bulk imports a previously exported collection. Existing documents are
+    kept as they are, so importing the same dump twice is harmless.
+    """
+    path = os.path.join(in_dir, coll_name + FORMAT_EXTENSIONS[fmt])
+    if not os.path.exists(path):
+        return 0
+
+    coll = db.collection(coll_name)
+    count = 0
+    for batch in READERS[fmt](path, batch_size):
+        res = coll.import_bulk(batch, on_duplicate='ignore', halt_on_error=False)
+        count += res['created']
+    return count
+
+
+# ===== CLI ===== #
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export or import the ytt_network graph collections')
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=list(FORMAT_EXTENSIONS),
+                        default='parquet')
+    parser.add_argument('--since', default=None,
+                        help='only export documents written since this ISO timestamp')
+    parser.add_argument('--collections', nargs='+',
+                        choices=list(COLLECTION_FIELDS),
+                        default=list(COLLECTION_FIELDS))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--hosts', default='http://localhost:8529')
+    args = parser.parse_args()
+
+    db = get_db(args.hosts)
+
+    for coll_name in args.collections:
+        if args.command == 'export':
+            os.makedirs(args.directory, exist_ok=True)
+            count = export_collection(db, coll_name, args.directory,
+                                      args.format, args.since, args.batch_size)
+            print(f'Exported {count} documents from {coll_name}')
+        else:
+            count = import_collection(db, coll_name, args.directory,
+                                      args.format, args.batch_size)
+            print(f'Imported {count} documents into {coll_name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@
 Sub-module that will expose functions for interacting with the ArangoDB
 """
 
+import logging
+
 from arango import ArangoClient
 from arango.exceptions import DocumentInsertError
 
@@ -9,12 +11,25 @@ from ytt_database.schema import (
     ChannelDetails,
     VideoDetails
 )
+from ytt_database.stats import GraphStats, STATS_COLLECTION, LEADERBOARD_KEY
+
+logger = logging.getLogger(__name__)
+
+
+def _log_insert_error(collection, key, e):
+    logger.info(
+        'Insert error (ignoring)',
+        extra={'event': 'insert_conflict', 'stage': 'db', 'collection': collection,
+               'key': key, 'error_code': e.error_code}
+    )
+
 
 class YttDatabase:
     def __init__(self, hosts='http://localhost:8529'):
         self._client = ArangoClient(hosts=hosts)
         self._db = self._client.db('ytt_db', username='root', password='password')
         self._graph = self._db.graph('ytt_network')
+        self._stats = GraphStats(self._db)
 
     # Access
 
@@ -29,11 +44,43 @@ class YttDatabase:
             return None
         return next(res)
 
+    def iter_channels(self, batch_size=10000):
+        """
+        Streams the identifying fields of every channel, for building lookup
+        indices without loading full documents.
+        """
+        return self._db.aql.execute(
+            'FOR c IN channel RETURN KEEP(c, "_key", "handle", "title")',
+            batch_size=batch_size,
+            stream=True
+        )
+
     def get_video(self, video_id):
         coll = self._db.collection('video')
         return coll.get({'_key': video_id})
 
 
+    # Statistics
+
+    def get_channel_stats(self, channel_id):
+        coll = self._db.collection(STATS_COLLECTION)
+        return coll.get(f'channel-{channel_id}')
+
+    def get_daily_edge_counts(self, day):
+        """
+        Returns the edges created on the given day, formatted YYYY-MM-DD (UTC)
+        """
+        coll = self._db.collection(STATS_COLLECTION)
+        return coll.get(f'day-{day}')
+
+    def get_vocalist_leaderboard(self):
+        coll = self._db.collection(STATS_COLLECTION)
+        doc = coll.get(LEADERBOARD_KEY)
+        return doc['entries'] if doc else []
+
+    def flush_stats(self):
+        self._stats.try_flush()
+
     # Insert
 
     def insert_channel(self, channel: ChannelDetails):
@@ -45,7 +92,7 @@ class YttDatabase:
             coll.insert(_channel)
         except DocumentInsertError as e:
             # probably key conflict (i.e. document already exists)
-            print(f'Insert error (ignoring): {repr(e)}')
+            _log_insert_error('channel', _channel['_key'], e)
 
     def insert_video(self, video: VideoDetails):
         coll = self._db.collection('video')
@@ -59,7 +106,7 @@ class YttDatabase:
             self.insert_upload_edge(channel_id, video_id)
         except DocumentInsertError as e:
             # probably key conflict (i.e. document already exists)
-            print(f'Insert error (ignoring): {repr(e)}')
+            _log_insert_error('video', video_id, e)
 
     def insert_upload_edge(self, channel_id, video_id):
         coll = self._db.collection('upload')
@@ -70,9 +117,10 @@ class YttDatabase:
         }
         try:
             coll.insert(payload)
+            self._stats.record_upload(channel_id)
         except DocumentInsertError as e:
             # probably key conflict (i.e. document already exists)
-            print(f'Insert error (ignoring): {repr(e)}')
+            _log_insert_error('upload', payload['_key'], e)
 
     def insert_vocalist_edge(self, video_id, channel_id):
         coll = self._db.collection('vocalist')
@@ -83,6 +131,7 @@ class YttDatabase:
         }
         try:
             coll.insert(payload)
+            self._stats.record_vocalist(channel_id)
         except DocumentInsertError as e:
             # probably key conflict (i.e. document already exists)
-            print(f'Insert error (ignoring): {repr(e)}')
\ No newline at end of file
+            _log_insert_error('vocalist', payload['_key'], e)
\ No newline at end of file
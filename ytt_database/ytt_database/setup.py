@@ -59,6 +59,10 @@ def run():
     channel_coll = db.collection('channel')
     channel_coll.add_hash_index(fields=['handle'], unique=True)
 
+    # Create aggregated statistics collection
+    if not db.has_collection('stats'):
+        db.create_collection('stats')
+
 
 if __name__ == '__main__':
     reset_db()
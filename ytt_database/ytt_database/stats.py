@@ -0,0 +1,242 @@
+"""
+Sub-module for aggregated graph statistics, kept in the `stats` collection so
+that dashboards can read a handful of documents instead of scanning the edge
+collections. Documents are:
+
+* `channel-<channel_id>`: upload count and cover (vocalist in-degree) count
+* `day-<YYYY-MM-DD>`: upload and vocalist edges created on that day (UTC)
+* `vocalist_leaderboard`: top-K channels by cover count
+
+Counters are updated incrementally by `YttDatabase` as edges are inserted, and
+can be recomputed from scratch with:
+
+    python -m ytt_database.stats rebuild
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from arango.exceptions import ArangoError
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = 'stats'
+LEADERBOARD_KEY = 'vocalist_leaderboard'
+DEFAULT_TOP_K = 100
+
+CHANNEL_UPSERT_QUERY = """
+FOR d IN @deltas
+    UPSERT { _key: d._key }
+    INSERT { _key: d._key, type: 'channel', channel_id: d.channel_id,
+             uploads: d.uploads, covers: d.covers }
+    UPDATE { uploads: OLD.uploads + d.uploads, covers: OLD.covers + d.covers }
+    IN @@coll
+    FILTER d.covers > 0
+    RETURN { channel_id: NEW.channel_id, covers: NEW.covers }
+"""
+
+DAY_UPSERT_QUERY = """
+FOR d IN @deltas
+    UPSERT { _key: d._key }
+    INSERT { _key: d._key, type: 'day', day: d.day,
+             upload_edges: d.upload_edges, vocalist_edges: d.vocalist_edges }
+    UPDATE { upload_edges: OLD.upload_edges + d.upload_edges,
+             vocalist_edges: OLD.vocalist_edges + d.vocalist_edges }
+    IN @@coll
+"""
+
+# Read and write happen in the same query, so concurrent writers cannot
+# overwrite each other's entries (one of them fails with a write conflict and
+# keeps its updates for the next flush instead). The cover counts passed in may
+# already be stale, so the current count is read from each channel document,
+# and entries are merged with MAX, since cover counts only grow
+LEADERBOARD_UPSERT_QUERY = """
+LET old = FIRST(FOR s IN @@coll FILTER s._key == @key RETURN s.entries) || []
+LET current = (
+    FOR u IN @updates
+        LET stored = FIRST(
+            FOR s IN @@coll
+                FILTER s._key == CONCAT('channel-', u.channel_id)
+                RETURN s.covers
+        )
+        RETURN { channel_id: u.channel_id, covers: MAX([u.covers, stored]) }
+)
+LET entries = (
+    FOR e IN UNION(old, current)
+        COLLECT channel_id = e.channel_id AGGREGATE covers = MAX(e.covers)
+        SORT covers DESC
+        LIMIT @top_k
+        RETURN { channel_id, covers }
+)
+UPSERT { _key: @key }
+INSERT { _key: @key, entries }
+UPDATE { entries }
+IN @@coll
+"""
+
+REBUILD_CHANNEL_QUERY = """
+FOR x IN UNION(
+        (FOR e IN upload RETURN { channel_id: PARSE_IDENTIFIER(e._from).key, u: 1, c: 0 }),
+        (FOR e IN vocalist RETURN { channel_id: PARSE_IDENTIFIER(e._to).key, u: 0, c: 1 })
+    )
+    COLLECT channel_id = x.channel_id
+    AGGREGATE uploads = SUM(x.u), covers = SUM(x.c)
+    RETURN { _key: CONCAT('channel-', channel_id), type: 'channel',
+             channel_id, uploads, covers }
+"""
+
+REBUILD_DAY_QUERY = """
+FOR e IN UNION(
+        (FOR u IN upload RETURN { rev: u._rev, coll: 'upload' }),
+        (FOR v IN vocalist RETURN { rev: v._rev, coll: 'vocalist' })
+    )
+    COLLECT day = SUBSTRING(DECODE_REV(e.rev).date, 0, 10)
+    AGGREGATE upload_edges = SUM(e.coll == 'upload' ? 1 : 0),
+              vocalist_edges = SUM(e.coll == 'vocalist' ? 1 : 0)
+    RETURN { _key: CONCAT('day-', day), type: 'day', day,
+             upload_edges, vocalist_edges }
+"""
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _merge_leaderboard(entries: List[Dict], updates: List[Dict], top_k: int) -> List[Dict]:
+    # Cover counts only grow, so merging the updated channels into the
+    # current top-K keeps the leaderboard exact
+    covers = {e['channel_id']: e['covers'] for e in entries}
+    for u in updates:
+        covers[u['channel_id']] = u['covers']
+    ranked = sorted(covers.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+    return [{'channel_id': c, 'covers': n} for c, n in ranked]
+
+
+class GraphStats:
+    """
+    Accumulates counter deltas in memory and writes them to the `stats`
+    collection in batches. Deltas are only cleared once they are written, so a
+    failed flush is retried with the next one.
+    """
+    def __init__(self, db, batch_size: int = 100, top_k: int = DEFAULT_TOP_K):
+        self._db = db
+        self._batch_size = batch_size
+        self._top_k = top_k
+        self._channel_deltas = defaultdict(lambda: {'uploads': 0, 'covers': 0})
+        self._day_deltas = defaultdict(lambda: {'upload_edges': 0, 'vocalist_edges': 0})
+        self._leaderboard_updates: Dict[str, int] = {}
+        self._pending = 0
+
+        # Deployments set up before the stats collection existed
+        if not db.has_collection(STATS_COLLECTION):
+            db.create_collection(STATS_COLLECTION)
+
+    def record_upload(self, channel_id: str):
+        self._channel_deltas[channel_id]['uploads'] += 1
+        self._day_deltas[_today()]['upload_edges'] += 1
+        self._record()
+
+    def record_vocalist(self, channel_id: str):
+        self._channel_deltas[channel_id]['covers'] += 1
+        self._day_deltas[_today()]['vocalist_edges'] += 1
+        self._record()
+
+    def _record(self):
+        self._pending += 1
+        if self._pending >= self._batch_size:
+            self.try_flush()
+
+    def try_flush(self) -> bool:
+        """
+        Like `flush`, but logs database errors instead of raising them, so
+        that statistics never get in the way of inserting the graph itself.
+        """
+        try:
+            self.flush()
+            return True
+        except ArangoError as e:
+            logger.warning(
+                'Stats flush failed (will retry)',
+                extra={'event': 'stats_flush_failed', 'stage': 'db',
+                       'pending': self._pending, 'error': str(e)}
+            )
+            # Retry after another batch rather than on every insert
+            self._pending = 0
+            return False
+
+    def flush(self):
+        # Each part is cleared as soon as it is written, so a failure part way
+        # through does not write (and count) the earlier parts twice
+        if self._channel_deltas:
+            channel_deltas = [
+                {'_key': f'channel-{channel_id}', 'channel_id': channel_id, **counts}
+                for channel_id, counts in self._channel_deltas.items()
+            ]
+            updated_covers = self._db.aql.execute(
+                CHANNEL_UPSERT_QUERY,
+                bind_vars={'deltas': channel_deltas, '@coll': STATS_COLLECTION}
+            )
+            for u in updated_covers:
+                self._leaderboard_updates[u['channel_id']] = u['covers']
+            self._channel_deltas.clear()
+
+        if self._day_deltas:
+            day_deltas = [
+                {'_key': f'day-{day}', 'day': day, **counts}
+                for day, counts in self._day_deltas.items()
+            ]
+            self._db.aql.execute(
+                DAY_UPSERT_QUERY,
+                bind_vars={'deltas': day_deltas, '@coll': STATS_COLLECTION}
+            )
+            self._day_deltas.clear()
+
+        if self._leaderboard_updates:
+            self._update_leaderboard(self._leaderboard_updates)
+            self._leaderboard_updates = {}
+
+        self._pending = 0
+
+    def _update_leaderboard(self, updates: Dict[str, int]):
+        self._db.aql.execute(
+            LEADERBOARD_UPSERT_QUERY,
+            bind_vars={
+                'updates': [{'channel_id': c, 'covers': n} for c, n in updates.items()],
+                'key': LEADERBOARD_KEY,
+                'top_k': self._top_k,
+                '@coll': STATS_COLLECTION,
+            }
+        )
+
+
+def rebuild(db, top_k: int = DEFAULT_TOP_K):
+    """
+    Recomputes every statistics document from the edge collections, e.g. after
+    a bulk import.
+    """
+    coll = db.collection(STATS_COLLECTION)
+    coll.truncate()
+
+    channel_docs = list(db.aql.execute(REBUILD_CHANNEL_QUERY))
+    coll.import_bulk(channel_docs)
+    coll.import_bulk(list(db.aql.execute(REBUILD_DAY_QUERY)))
+
+    leaderboard = _merge_leaderboard(
+        [], [d for d in channel_docs if d['covers'] > 0], top_k)
+    coll.insert({'_key': LEADERBOARD_KEY, 'entries': leaderboard}, overwrite=True)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from ytt_database.export import get_db
+
+    parser = argparse.ArgumentParser(description='Maintain graph statistics')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--hosts', default='http://localhost:8529')
+    args = parser.parse_args()
+
+    rebuild(get_db(args.hosts), args.top_k)
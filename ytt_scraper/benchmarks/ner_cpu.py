@@ -0,0 +1,96 @@
+"""
+Accuracy/throughput benchmark for the CPU inference mode, against the default
+`TransitionBasedParserModel` on the same evaluation set (a spaCy DocBin, e.g.
+the dev corpus used with `cpu_base_config.cfg`).
+
+    python benchmarks/ner_cpu.py ./model-best ./corpus/dev.spacy
+
+`--quantize` only applies to transformer pipelines.
+"""
+
+import time
+import argparse
+from typing import List, Set, Tuple
+
+from ytt_scraper.ner.model import (
+    NERModel,
+    TransitionBasedParserModel,
+    CPUTransitionBasedParserModel,
+)
+
+
+def load_eval_set(path: str, vocab, classes: Set[str], limit: int = None):
+    from spacy.tokens import DocBin
+
+    texts, gold = [], []
+    for doc in DocBin().from_disk(path).get_docs(vocab):
+        texts.append(doc.text)
+        gold.append({(e.label_, e.text) for e in doc.ents if e.label_ in classes})
+        if limit is not None and len(texts) >= limit:
+            break
+    return texts, gold
+
+
+def score(preds: List[List[Tuple]], gold: List[Set[Tuple]]):
+    """
+    Micro-averaged precision, recall and F1 over (label, text) pairs per doc.
+    Offsets are not compared, since windowing changes them.
+    """
+    tp, n_pred, n_gold = 0, 0, 0
+    for p, g in zip(preds, gold):
+        p = set(p)
+        tp += len(p & g)
+        n_pred += len(p)
+        n_gold += len(g)
+    precision = tp / n_pred if n_pred else 0.0
+    recall = tp / n_gold if n_gold else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def run(model: NERModel, texts: List[str], gold: List[Set[Tuple]]):
+    start = time.perf_counter()
+    preds = model.extract_entities_batch(texts)
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed, score(preds, gold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the CPU NER inference mode')
+    parser.add_argument('model_path')
+    parser.add_argument('eval_path', help='spaCy DocBin with gold entities')
+    parser.add_argument('--classes', nargs='+', default=['VOCALIST_REF'])
+    parser.add_argument('--n-threads', type=int, default=None)
+    parser.add_argument('--quantize', action='store_true')
+    parser.add_argument('--max-chars', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=None)
+    args = parser.parse_args()
+
+    baseline = TransitionBasedParserModel(args.classes, args.model_path)
+    texts, gold = load_eval_set(
+        args.eval_path, baseline._model.vocab, set(args.classes), args.limit)
+
+    # The CPU model's require_cpu() and thread limits are process-wide, so it
+    # is only built once the baseline has been timed
+    results = {'baseline': run(baseline, texts, gold)}
+    del baseline
+
+    cpu_model = CPUTransitionBasedParserModel(
+        args.classes, args.model_path,
+        n_threads=args.n_threads,
+        quantize=args.quantize,
+        max_chars=args.max_chars
+    )
+    results['cpu'] = run(cpu_model, texts, gold)
+
+    print(f"{'model':<10} {'docs/s':>10} {'P':>7} {'R':>7} {'F1':>7}")
+    for name, (docs_per_s, (p, r, f1)) in results.items():
+        print(f"{name:<10} {docs_per_s:>10.1f} {p:>7.3f} {r:>7.3f} {f1:>7.3f}")
+
+    speedup = results['cpu'][0] / results['baseline'][0]
+    f1_delta = results['cpu'][1][2] - results['baseline'][1][2]
+    print(f"\nspeedup: {speedup:.2f}x, F1 change: {f1_delta:+.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Startup benchmark for the scraper package. Each import is timed in a fresh
+interpreter, since module caching makes in-process timings meaningless.
+
+    python benchmarks/startup.py --runs 10
+"""
+
+import sys
+import argparse
+import statistics
+import subprocess
+
+IMPORTS = [
+    'import ytt_scraper',
+    'from ytt_scraper.ner import preprocess',
+    'from ytt_scraper.ner import model',
+    'from ytt_scraper.ner import registry',
+    'from ytt_scraper import handler',
+]
+
+CHILD_SCRIPT = """
+import time, resource
+t = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - t
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def time_import(statement: str, runs: int):
+    times, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD_SCRIPT.format(statement=statement)],
+            capture_output=True, text=True, check=True
+        )
+        elapsed, maxrss = out.stdout.split()
+        times.append(float(elapsed))
+        rss.append(int(maxrss))
+    return statistics.median(times), max(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ytt_scraper import time')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'statement':<45} {'median (ms)':>12} {'max RSS (MB)':>13}")
+    for statement in IMPORTS:
+        median, maxrss = time_import(statement, args.runs)
+        print(f"{statement:<45} {median * 1000:>12.1f} {maxrss / 1024:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,14 @@
-import ytt_scraper.config
-import ytt_scraper.youtube
-import ytt_scraper.handler
+"""
+Submodules are imported lazily on first attribute access, so that importing
+the package does not pull in the Youtube client or spaCy until they are used.
+"""
 
-import ytt_scraper.ner
\ No newline at end of file
+import importlib
+
+_SUBMODULES = {'config', 'schema', 'concurrency', 'youtube', 'handler', 'ner'}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
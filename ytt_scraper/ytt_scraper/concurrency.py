@@ -0,0 +1,143 @@
+"""
+Module for adapting the number of concurrent outbound API calls to what the
+API can currently sustain, and for retrying transient failures.
+
+The limit follows an AIMD scheme: it grows additively (about +1 per limit's
+worth of successful calls) while latency stays close to the best latency seen,
+shrinks gently when latency rises (queueing on the server), and is cut
+multiplicatively on overload responses such as 429/5xx. Calls which were
+already in flight when the limit was cut do not cut it again, so that a burst
+of failures from calls running at the same time counts as a single congestion
+signal (at most one cut per window of calls).
+
+Endpoints can differ a lot in latency (e.g. `search.list` against
+`channels.list`), so the latency baseline is kept per request type.
+"""
+
+import time
+import random
+import threading
+from typing import Callable, Dict, Any, Hashable, List
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(self,
+                 initial_limit: int = 4,
+                 min_limit: int = 1,
+                 max_limit: int = 32,
+                 latency_tolerance: float = 2.0,
+                 backoff_ratio: float = 0.5,
+                 smoothing: float = 0.2):
+        self._limit = float(initial_limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._latency_tolerance = latency_tolerance
+        self._backoff_ratio = backoff_ratio
+        self._smoothing = smoothing
+
+        self._in_flight = 0
+        # Request type -> [min latency, smoothed latency]
+        self._latency: Dict[Hashable, List[float]] = {}
+        self._n_started = 0
+        # Calls started up to this number were in flight at the last cut
+        self._last_decrease_at = 0
+        self._n_calls = 0
+        self._n_overloads = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'latency': {
+                    str(request_type): {'min': min_latency, 'avg': avg_latency}
+                    for request_type, (min_latency, avg_latency) in self._latency.items()
+                },
+                'calls': self._n_calls,
+                'overloads': self._n_overloads,
+            }
+
+    def acquire(self) -> int:
+        """
+        Waits for a slot, and returns a ticket to pass back to `release`
+        """
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+            self._n_started += 1
+            return self._n_started
+
+    def release(self, latency: float, overloaded: bool = False,
+                request_type: Hashable = None, ticket: int = None):
+        with self._cond:
+            self._in_flight -= 1
+            self._n_calls += 1
+
+            if overloaded:
+                self._n_overloads += 1
+                self._decrease(self._backoff_ratio, ticket)
+            else:
+                min_latency, avg_latency = self._update_latency(request_type, latency)
+                if avg_latency > self._latency_tolerance * min_latency:
+                    # Latency is building up, back off gently
+                    self._decrease(0.9, ticket)
+                else:
+                    self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+
+            self._cond.notify_all()
+
+    def _decrease(self, ratio: float, ticket: int = None):
+        # A call which started before the last cut has already been accounted
+        # for by it
+        if ticket is not None and ticket <= self._last_decrease_at:
+            return
+        self._limit = max(self._min_limit, self._limit * ratio)
+        self._last_decrease_at = self._n_started
+
+    def _update_latency(self, request_type: Hashable, latency: float) -> List[float]:
+        stats = self._latency.get(request_type)
+        if stats is None:
+            stats = self._latency[request_type] = [latency, latency]
+            return stats
+        # The minimum drifts up slowly so that it can follow a baseline shift
+        stats[0] = min(stats[0] * 1.001, latency)
+        stats[1] += self._smoothing * (latency - stats[1])
+        return stats
+
+    def call(self, fn: Callable, *args,
+             request_type: Hashable = None,
+             is_overload: Callable[[Exception], bool] = lambda e: False, **kwargs):
+        ticket = self.acquire()
+        start = time.monotonic()
+        overloaded = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self.release(time.monotonic() - start, overloaded, request_type, ticket)
+
+
+def retry_with_backoff(fn: Callable,
+                       is_transient: Callable[[Exception], bool],
+                       max_retries: int = 5,
+                       base_delay: float = 0.5,
+                       max_delay: float = 30.0):
+    """
+    Calls `fn`, retrying transient errors with full-jitter exponential backoff.
+    Non-transient errors, and the last transient error, are raised as is.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if (not is_transient(e)) or attempt == max_retries:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
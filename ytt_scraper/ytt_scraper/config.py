@@ -10,4 +10,15 @@ def get_youtube_credentials():
 
 
 def get_model_path(model_name: str = 'DEFAULT'):
-    return os.environ[f'{model_name}_MODEL_PATH']
\ No newline at end of file
+    return os.environ[f'{model_name}_MODEL_PATH']
+
+def get_api_concurrency_config():
+    return {
+        'initial_limit': int(os.environ.get('YOUTUBE_INITIAL_CONCURRENCY', 4)),
+        'min_limit': int(os.environ.get('YOUTUBE_MIN_CONCURRENCY', 1)),
+        'max_limit': int(os.environ.get('YOUTUBE_MAX_CONCURRENCY', 16)),
+    }
+
+
+def get_api_max_retries():
+    return int(os.environ.get('YOUTUBE_MAX_RETRIES', 5))
@@ -3,21 +3,37 @@ Module which contains functions which interface with the Youtube and NER layers.
 These are the methods exposed as the API for other code.
 """
 
-from typing import List, Dict, Any
+import logging
+import itertools
+from typing import List, Dict, Any, Iterator
 from requests.exceptions import ConnectionError
 import cachetools.func
 
 from ytt_scraper import youtube as yt
+from ytt_scraper.schema import VideoRecord
 from ytt_database.schema import ChannelDetails, VideoDetails
 
+logger = logging.getLogger(__name__)
+
 
 # ===== Internal functions ===== #
 
+def _log_query_error(e: ConnectionError, what: str, **ids):
+    # Queries also raise ConnectionError when there are no results (e.g. an
+    # unknown handle, or an empty last page), which is not a failure
+    if isinstance(e, yt.TransientAPIError):
+        logger.warning(f"Connection failed while trying to get {what}",
+                       extra={'event': 'api_failed', 'stage': 'api', 'error': str(e), **ids})
+    else:
+        logger.info(f"No results while trying to get {what}",
+                    extra={'event': 'api_not_found', 'stage': 'api', **ids})
+
+
 def _get_playlist_video_ids(playlist_id: str) -> List[str]:
     try:
         details = yt.query_playlist_videos(playlist_id)
-    except ConnectionError:
-        print("Connection failed while trying to get playlist videos")
+    except ConnectionError as e:
+        _log_query_error(e, 'playlist videos', playlist_id=playlist_id)
         return []
 
     items = details['items']
@@ -29,8 +45,8 @@ def _get_playlist_video_ids(playlist_id: str) -> List[str]:
 def _get_channel_video_ids(channel_id: str) -> List[str]:
     try:
         details = yt.query_channel_videos(channel_id)
-    except ConnectionError:
-        print("Connection failed while trying to get channel videos")
+    except ConnectionError as e:
+        _log_query_error(e, 'channel videos', channel_id=channel_id)
         return []
 
     items = details['items']
@@ -39,35 +55,60 @@ def _get_channel_video_ids(channel_id: str) -> List[str]:
             if item['id']['kind'] == 'youtube#video']
 
 
-def _get_videos(video_ids: List[str]) -> List[VideoDetails]:
+def _iter_channel_video_id_pages(channel_id: str, max_pages: int = None) -> Iterator[List[str]]:
+    page_token = None
+    for _ in itertools.islice(itertools.count(), max_pages):
+        try:
+            details = yt.query_channel_videos(channel_id, page_token=page_token)
+        except ConnectionError as e:
+            _log_query_error(e, 'channel videos', channel_id=channel_id)
+            return
+
+        items = details['items']
+        yield [item['id']['videoId']
+               for item in items
+               if item['id']['kind'] == 'youtube#video']
+
+        page_token = details.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def _get_video_records(video_ids: List[str]) -> List[VideoRecord]:
+    if not video_ids:
+        return []
+
     try:
         videos = yt.query_videos(video_ids)
-    except ConnectionError:
-        print("Connection failed while trying to get videos")
+    except ConnectionError as e:
+        _log_query_error(e, 'videos', n_videos=len(video_ids))
         return []
 
     items = videos['items']
     return [
-        VideoDetails(
+        VideoRecord(
             video_id=item['id'],
             channel_id=item['snippet']['channelId'],
             publish_time=item['snippet']['publishedAt'],
             title=item['snippet']['title'],
             description=item['snippet']['description'],
-            cleaned_text=None
         )
         for item in items
     ]
 
 
+def _get_videos(video_ids: List[str]) -> List[VideoDetails]:
+    return [r.to_details() for r in _get_video_records(video_ids)]
+
+
 # ===== External functions ===== #
 
 @cachetools.func.ttl_cache(maxsize=256, ttl=20 * 60)
 def get_channel_details(channel_handle: str) -> ChannelDetails:
     try:
         details = yt.query_channel_details(channel_handle)
-    except ConnectionError:
-        print("Connection failed while trying to get channel information")
+    except ConnectionError as e:
+        _log_query_error(e, 'channel information', channel_handle=channel_handle)
         return {}
 
     item = details['items'][0]
@@ -87,6 +128,16 @@ def get_videos_from_channel_id(channel_id: str) -> List[VideoDetails]:
     return videos
 
 
+def iter_video_pages_from_channel_id(channel_id: str,
+                                     max_pages: int = None) -> Iterator[List[VideoRecord]]:
+    """
+    Yields the videos of a channel one page at a time, as lightweight records,
+    so that only a single page needs to be held in memory.
+    """
+    for video_ids in _iter_channel_video_id_pages(channel_id, max_pages):
+        yield _get_video_records(video_ids)
+
+
 def get_videos_from_playlist_id(playlist_id: str) -> List[VideoDetails]:
     video_ids = _get_playlist_video_ids(playlist_id)
     videos = _get_videos(video_ids)
@@ -1,2 +1,9 @@
-import ytt_scraper.ner.model
-import ytt_scraper.ner.preprocess
\ No newline at end of file
+import importlib
+
+_SUBMODULES = {'model', 'preprocess', 'normalize', 'registry', 'cache'}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
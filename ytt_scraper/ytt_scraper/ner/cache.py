@@ -0,0 +1,134 @@
+"""
+Persistent, content-addressed cache for NER results. Entries are keyed by a
+hash of the model identity and the cleaned text, so the same text is only run
+through a model once, and retraining or changing a model invalidates its
+entries automatically.
+
+Each cache file is meant to belong to a single model; entries from other model
+identities are purged when the cache is opened for a model.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Tuple, Dict, Any
+
+from ytt_scraper.ner.model import NERModel
+
+
+def content_key(model_identity: str, text: str) -> str:
+    h = hashlib.sha256()
+    h.update(model_identity.encode('utf-8'))
+    h.update(b'\0')
+    h.update(text.encode('utf-8'))
+    return h.hexdigest()
+
+
+class NERCache:
+    def __init__(self, path: str, max_entries: int = 100_000, touch_batch_size: int = 256):
+        self._max_entries = max_entries
+        self._touch_batch_size = touch_batch_size
+        self._lock = threading.Lock()
+
+        # Access times of hits are buffered and written in batches, so that a
+        # hit is only a read
+        self._touched: Dict[str, float] = {}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entities ('
+            'key TEXT PRIMARY KEY, model TEXT, entities TEXT, last_access REAL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS entities_last_access ON entities (last_access)'
+        )
+        self._conn.commit()
+        self._count = self._conn.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+
+    def get(self, key: str) -> List[Tuple] | None:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT entities FROM entities WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= self._touch_batch_size:
+                self._flush_touched()
+                self._conn.commit()
+        return [tuple(e) for e in json.loads(row[0])]
+
+    def put(self, key: str, model_identity: str, entities: List[Tuple]):
+        with self._lock:
+            # The key is a content hash, so an existing row already holds the
+            # same result; only new rows are counted
+            cur = self._conn.execute(
+                'INSERT OR IGNORE INTO entities VALUES (?, ?, ?, ?)',
+                (key, model_identity, json.dumps(entities), time.time())
+            )
+            self._count += cur.rowcount
+            if self._count > self._max_entries:
+                self._flush_touched()
+                self._evict()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        self._conn.executemany(
+            'UPDATE entities SET last_access = ? WHERE key = ?',
+            [(t, k) for k, t in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def invalidate_other_models(self, model_identity: str):
+        with self._lock:
+            cur = self._conn.execute(
+                'DELETE FROM entities WHERE model != ?', (model_identity,)
+            )
+            self._conn.commit()
+            self._count -= cur.rowcount
+
+    def _evict(self):
+        # Drop the least recently used tenth, so eviction is not run on
+        # every insert once the cache is full
+        n_evict = self._count - int(self._max_entries * 0.9)
+        self._conn.execute(
+            'DELETE FROM entities WHERE key IN ('
+            'SELECT key FROM entities ORDER BY last_access LIMIT ?)', (n_evict,)
+        )
+        self._count = self._conn.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+
+class CachedNERModel(NERModel):
+    """
+    Wraps a NER model so that entity extraction goes through an `NERCache`
+    """
+    def __init__(self, model: NERModel, cache: NERCache):
+        super().__init__(model._classes)
+        self._model = model
+        self._cache = cache
+        self._identity = model.model_identity()
+        self._cache.invalidate_other_models(self._identity)
+
+    def extract_entities(self, text: str) -> List[Tuple]:
+        key = content_key(self._identity, text)
+        entities = self._cache.get(key)
+        if entities is None:
+            entities = self._model.extract_entities(text)
+            self._cache.put(key, self._identity, entities)
+        return entities
+
+    def get_entities(self, entity_list: List[Tuple], entity: str) -> Dict[str, Any]:
+        return self._model.get_entities(entity_list, entity)
+
+    def model_identity(self) -> str:
+        return self._identity
@@ -5,13 +5,16 @@ between traditional parser models and possibly transformer-based models.
 Model paths will be stored as configuration variables.
 """
 
+import os
 import re
 from abc import ABC, abstractmethod
 from typing import Iterable, List, Tuple, Dict, Any
 
-import spacy
-
 from ytt_scraper.config import get_model_path
+from ytt_scraper.ner.normalize import normalize_reference
+
+# Components needed for NER, everything else is excluded in CPU mode
+NER_COMPONENTS = {'transformer', 'tok2vec', 'ner'}
 
 
 class NERModel(ABC):
@@ -32,7 +35,19 @@ class NERModel(ABC):
     def get_entities(self, entity_list: List[Tuple], entity: str) -> Dict[str, Any]:
         """
         Given an entity of interest, returns a dictionary of entities, mapping
-        the entity to other related entities.
+        the entity to other related entities. Keys are normalized references
+        (see `normalize.normalize_reference`).
+        """
+        pass
+
+    def extract_entities_batch(self, texts: Iterable[str]) -> List[List[Tuple]]:
+        return [self.extract_entities(text) for text in texts]
+
+    @abstractmethod
+    def model_identity(self) -> str:
+        """
+        Returns a string which changes whenever the model would produce
+        different output for the same input, e.g. when the model is retrained.
         """
         pass
 
@@ -44,32 +59,155 @@ class TransitionBasedParserModel(NERModel):
         if model_path is None:
             model_path = get_model_path()
         self._model_path = model_path
-        self._model = spacy.load(model_path)
+        self._model = self._load_model(model_path)
 
-    def extract_entities(self, text: str) -> List[Tuple]:
-        preds = self._model(text)
+    def _load_model(self, model_path: str):
+        import spacy
+        return spacy.load(model_path)
+
+    def _get_entities_from_doc(self, doc) -> List[Tuple]:
         return [(e.label_, e.text)
-                for e in preds.ents
+                for e in doc.ents
                 if e.label_ in self._classes]
 
+    def extract_entities(self, text: str) -> List[Tuple]:
+        preds = self._model(text)
+        return self._get_entities_from_doc(preds)
+
+    def extract_entities_batch(self, texts: Iterable[str]) -> List[List[Tuple]]:
+        return [self._get_entities_from_doc(doc) for doc in self._model.pipe(texts)]
+
     def get_entities(self, entity_list: List[Tuple], entity: str) -> Dict[str, Any]:
         output = {}
         for (_label, _text) in entity_list:
-            if _label == entity:
-                output[_text[1:]] = _text
+            if _label == entity and (ref := normalize_reference(_text)):
+                output[ref] = _text
         return output
 
+    def model_identity(self) -> str:
+        meta_path = os.path.join(self._model_path, 'meta.json')
+        mtime = os.path.getmtime(meta_path) if os.path.exists(meta_path) else None
+        return f'{type(self).__name__}:{os.path.abspath(self._model_path)}:{mtime}'
+
+
+class CPUTransitionBasedParserModel(TransitionBasedParserModel):
+    """
+    Inference mode for CPU-only machines. Long texts are windowed to the lines
+    where references appear and batches go through `nlp.pipe`. The BLAS and
+    OpenMP thread pools used by the thinc/NumPy ops (and torch, if installed)
+    are pinned to the available cores, through `threadpoolctl`.
+
+    Only the components needed for NER are loaded, and the linear layers of
+    transformer pipelines can be quantized to int8; neither applies to a plain
+    tok2vec/ner pipeline such as `cpu_base_config.cfg`, which is pure thinc.
+    """
+    def __init__(self,
+                 classes: Iterable,
+                 model_path: str = None,
+                 n_threads: int = None,
+                 quantize: bool = False,
+                 max_chars: int = 2000,
+                 batch_size: int = 64):
+        if n_threads is None:
+            # sched_getaffinity respects CPU pinning, but is Linux-only
+            if hasattr(os, 'sched_getaffinity'):
+                n_threads = len(os.sched_getaffinity(0))
+            else:
+                n_threads = os.cpu_count() or 1
+        self._n_threads = n_threads
+        self._quantize = quantize
+        self._max_chars = max_chars
+        self._batch_size = batch_size
+        super().__init__(classes, model_path)
+
+    def _load_model(self, model_path: str):
+        import spacy
+
+        spacy.require_cpu()
+        self._pin_threads()
+
+        pipeline = spacy.util.get_model_meta(model_path).get('pipeline', [])
+        nlp = spacy.load(
+            model_path,
+            exclude=[p for p in pipeline if p not in NER_COMPONENTS]
+        )
+        if self._quantize:
+            self._quantize_model(nlp)
+        return nlp
+
+    def _pin_threads(self):
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError as e:
+            raise ImportError(
+                "CPU mode needs threadpoolctl to pin the BLAS/OpenMP threads "
+                "(pip install threadpoolctl)"
+            ) from e
+        # Kept for the lifetime of the model; the limits are process-wide
+        self._threadpool_limits = threadpool_limits(limits=self._n_threads)
+
+        # Only transformer pipelines run on torch
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(self._n_threads)
+
+    def _quantize_model(self, nlp):
+        """
+        Applies dynamic int8 quantization to the linear layers of every
+        PyTorch-backed component. Raises if the pipeline has none, since
+        quantization would silently do nothing.
+        """
+        from thinc.api import PyTorchShim
+
+        shims = [
+            shim
+            for _, component in nlp.pipeline if hasattr(component, 'model')
+            for node in component.model.walk()
+            for shim in node.shims if isinstance(shim, PyTorchShim)
+        ]
+        if not shims:
+            raise ValueError(
+                f"quantize=True needs a PyTorch-based (transformer) pipeline, "
+                f"but {nlp.pipe_names} has no PyTorch components"
+            )
+
+        import torch
+        for shim in shims:
+            shim._model = torch.quantization.quantize_dynamic(
+                shim._model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def extract_entities(self, text: str) -> List[Tuple]:
+        from ytt_scraper.ner.preprocess import window_text
+
+        return super().extract_entities(window_text(text, self._max_chars))
+
+    def extract_entities_batch(self, texts: Iterable[str]) -> List[List[Tuple]]:
+        from ytt_scraper.ner.preprocess import window_text
+
+        docs = self._model.pipe(
+            (window_text(text, self._max_chars) for text in texts),
+            batch_size=self._batch_size
+        )
+        return [self._get_entities_from_doc(doc) for doc in docs]
+
+    def model_identity(self) -> str:
+        return f'{super().model_identity()}:q={self._quantize}:max_chars={self._max_chars}'
+
 
 class RegexBasedParserModel(NERModel):
     """
     Baseline model only for extracting Youtube links in descriptions, regardless
-    of role
+    of role. References keep their `@`/`c/`/`user/`/`channel/` prefix, so that
+    they are never mistaken for free text (e.g. a channel title).
     """
     def __init__(self, classes: Iterable):
         super().__init__(classes)
 
-        self.expr1 = re.compile(r"youtube\.com/(@|c\/|user\/|channel\/)([\w|\-]+)\/?")
-        self.expr2 = re.compile(r"\s(@)([\w|\-]+)")
+        self.expr1 = re.compile(r"youtube\.com/((?:@|c\/|user\/|channel\/)[\w|\-]+)\/?")
+        self.expr2 = re.compile(r"\s(@[\w|\-]+)")
 
     def extract_entities(self, text: str) -> List[Tuple]:
         matches1 = re.findall(self.expr1, text)
@@ -77,12 +215,16 @@ class RegexBasedParserModel(NERModel):
         matches = set(matches1 + matches2)
         return [
             ('VOCALIST_REF', ref)
-            for (_, ref) in matches
+            for ref in matches
         ]
 
     def get_entities(self, entity_list: List[Tuple], entity: str) -> Dict[str, Any]:
         output = {}
         for (_label, _text) in entity_list:
-            if _label == entity:
-                output[_text] = _text
-        return output
\ No newline at end of file
+            if _label == entity and (ref := normalize_reference(_text)):
+                output[ref] = _text
+        return output
+
+    def model_identity(self) -> str:
+        patterns = '|'.join([self.expr1.pattern, self.expr2.pattern])
+        return f'{type(self).__name__}:{sorted(self._classes)}:{patterns}'
@@ -0,0 +1,38 @@
+"""
+Submodule for canonicalizing channel references extracted by the NER models,
+so that variants of the same reference (case, URL prefixes, trailing
+punctuation) map to the same key.
+"""
+
+import re
+
+CHANNEL_ID_REGEX = re.compile(r"^UC[\w\-]{22}$")
+URL_PREFIX_REGEX = re.compile(
+    r"^(?:https?://)?(?:www\.|m\.)?(?:youtube\.com/)?(?:@|c/|user/|channel/)?",
+    re.IGNORECASE
+)
+TRAILING_PUNCTUATION = ".,;:!?)]}'\"/"
+
+
+def is_handle_reference(ref: str) -> bool:
+    """
+    Whether a raw reference is explicitly a handle, legacy name or channel
+    (an `@`, URL or `c/`/`user/`/`channel/` prefix, or a channel ID), as
+    opposed to free text such as a channel title.
+    """
+    _ref = ref.strip()
+    return bool(URL_PREFIX_REGEX.match(_ref).group(0)) or bool(CHANNEL_ID_REGEX.match(_ref))
+
+
+def normalize_reference(ref: str) -> str:
+    """
+    Returns the canonical form of a channel reference, or an empty string if
+    nothing is left. Channel IDs are case-sensitive and are kept as they are;
+    everything else is casefolded, since handles are case-insensitive.
+    """
+    _ref = ref.strip()
+    _ref = URL_PREFIX_REGEX.sub('', _ref, count=1)
+    _ref = _ref.rstrip(TRAILING_PUNCTUATION).lstrip('@')
+    if CHANNEL_ID_REGEX.match(_ref):
+        return _ref
+    return _ref.casefold()
@@ -3,14 +3,20 @@ Submodule for cleaning up description data for the NER model.
 """
 
 import re
-from typing import List, Dict
+from typing import List, Dict, Iterable
 
 from unidecode import unidecode
 
+from ytt_scraper.schema import VideoRecord
 from ytt_database.schema import VideoDetails
 
 NONWORD_REGEX = re.compile(r"[^\w+:/\\.#\=\-\?\’'\<\>@\n\u3040-\u309F\u30A0-\u30FF\u4300-\u9faf]")
 COVER_REGEX = re.compile(r"cover|tsutemita|utattemita|utaite", re.IGNORECASE)
+REFERENCE_CUE_REGEX = re.compile(
+    r"@|youtube\.com|vocal|sing|mix|\binst|illust|\bart\b|\bvideo\b|\bedit|\bfeat|\bft\b|\bby\b",
+    re.IGNORECASE
+)
+NEWLINE_TOKEN = '<NEWLINE>'
 
 
 def custom_tokenizer(text: str, return_list: bool = True):
@@ -27,13 +33,38 @@ def clean_text(text: str):
     return custom_tokenizer(subbed_text, return_list=False)
 
 
+def window_text(text: str, max_chars: int, context_lines: int = 1) -> str:
+    """
+    Shortens cleaned text for inference by keeping only the lines which look
+    like they contain references (credits, links, mentions), plus some
+    surrounding lines, then truncating to `max_chars`.
+    """
+    if len(text) <= max_chars:
+        return text
+
+    lines = text.split(NEWLINE_TOKEN)
+    keep = set()
+    for i, line in enumerate(lines):
+        if REFERENCE_CUE_REGEX.search(line):
+            keep.update(range(max(0, i - context_lines), i + context_lines + 1))
+
+    if keep:
+        text = NEWLINE_TOKEN.join(lines[i] for i in sorted(keep) if i < len(lines))
+    return text[:max_chars]
+
+
 def clean_video(video: VideoDetails) -> VideoDetails:
     text = video.title + ' ' + video.description
     video.cleaned_text = clean_text(text)
     return video
 
 
-def filter_videos(videos: List[VideoDetails]) -> List[VideoDetails]:
+def clean_record(record: VideoRecord) -> VideoRecord:
+    record.cleaned_text = clean_text(record.title + ' ' + record.description)
+    return record
+
+
+def filter_videos(videos: Iterable[VideoRecord]) -> List[VideoRecord]:
     """
     Filters out videos which do not have certain keywords in the title or
     description
@@ -41,4 +72,4 @@ def filter_videos(videos: List[VideoDetails]) -> List[VideoDetails]:
     return [
         v for v in videos
         if COVER_REGEX.search(v.cleaned_text)
-    ]
\ No newline at end of file
+    ]
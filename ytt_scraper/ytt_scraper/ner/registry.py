@@ -0,0 +1,57 @@
+"""
+Registry for NER models. Models are loaded on first request, warmed up with a
+short dummy input, and shared by everything in the process that asks for the
+same model.
+
+To share a model across worker processes, call `preload` in the parent before
+forking, so that workers inherit the loaded model instead of loading their own.
+"""
+
+import threading
+from typing import Dict, Iterable, Tuple
+
+from ytt_scraper.ner.model import (
+    NERModel,
+    TransitionBasedParserModel,
+    CPUTransitionBasedParserModel,
+    RegexBasedParserModel,
+)
+
+MODEL_TYPES = {
+    'transition': TransitionBasedParserModel,
+    'transition_cpu': CPUTransitionBasedParserModel,
+    'regex': RegexBasedParserModel,
+}
+
+WARMUP_TEXT = "Vocals @example <NEWLINE> Mix youtube.com/@example cover"
+
+_models: Dict[Tuple, NERModel] = {}
+_lock = threading.Lock()
+
+
+def _model_key(model_type: str, classes: Iterable, kwargs: Dict) -> Tuple:
+    return (model_type, tuple(sorted(classes)), tuple(sorted(kwargs.items())))
+
+
+def get_model(model_type: str, classes: Iterable = ("VOCALIST_REF",), **kwargs) -> NERModel:
+    """
+    Returns the shared instance of the given model type, loading and warming it
+    up if this is the first request for it. Extra keyword arguments are passed
+    to the model constructor and are part of the model identity.
+    """
+    key = _model_key(model_type, classes, kwargs)
+    with _lock:
+        if key not in _models:
+            model = MODEL_TYPES[model_type](classes, **kwargs)
+            model.extract_entities(WARMUP_TEXT)
+            _models[key] = model
+        return _models[key]
+
+
+def preload(model_type: str, classes: Iterable = ("VOCALIST_REF",), **kwargs) -> NERModel:
+    return get_model(model_type, classes, **kwargs)
+
+
+def clear():
+    with _lock:
+        _models.clear()
@@ -3,10 +3,13 @@ Data type definitions and schemas for interfacing within and outside the
 module. Most will be written in Pydantic with appropriate ser/de.
 """
 
+from dataclasses import dataclass
 from datetime import datetime
 
 from pydantic import BaseModel
 
+from ytt_database.schema import VideoDetails
+
 
 # class ChannelDetails(BaseModel):
 #     channel_id: str
@@ -22,4 +25,31 @@ from pydantic import BaseModel
 #     publish_time: datetime
 #     title: str
 #     description: str
-#     cleaned_text: str | None
\ No newline at end of file
+#     cleaned_text: str | None
+
+
+# In-flight records
+
+@dataclass(slots=True)
+class VideoRecord:
+    """
+    Lightweight video record used inside the crawl pipeline. Validation only
+    happens when it is converted to `VideoDetails`, once, at the DB and queue
+    boundary.
+    """
+    video_id: str
+    channel_id: str
+    publish_time: str
+    title: str
+    description: str
+    cleaned_text: str | None = None
+
+    def to_details(self) -> VideoDetails:
+        return VideoDetails(
+            video_id=self.video_id,
+            channel_id=self.channel_id,
+            publish_time=self.publish_time,
+            title=self.title,
+            description=self.description,
+            cleaned_text=self.cleaned_text
+        )
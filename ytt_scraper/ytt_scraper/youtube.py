@@ -3,30 +3,97 @@ Module which contains Youtube API calls. Outputs are responses which are still
 in the documented format.
 """
 
+import functools
+import threading
 from typing import List, Dict, Any
 from requests.exceptions import ConnectionError
 
-import googleapiclient.discovery
-import googleapiclient.errors
+from ytt_scraper.config import (
+    get_youtube_credentials,
+    get_api_concurrency_config,
+    get_api_max_retries,
+)
+from ytt_scraper.concurrency import AdaptiveConcurrencyLimiter, retry_with_backoff
 
-from ytt_scraper.config import get_youtube_credentials
+# Rate limiting and server errors, which are worth retrying
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
 
-API_SERVICE_NAME, API_VERSION, API_KEY = get_youtube_credentials()
+_local = threading.local()
+
+
+class TransientAPIError(ConnectionError):
+    """
+    Raised when a call still fails with a transient error after all retries
+    """
+    pass
+
+
+def _get_youtube():
+    """
+    Builds the API client on first use. The credentials and the (heavy)
+    Google API client library are only loaded when a query is made. The client
+    is not thread-safe, so each thread gets its own.
+    """
+    if not hasattr(_local, 'youtube'):
+        import googleapiclient.discovery
+
+        api_service_name, api_version, api_key = get_youtube_credentials()
+        _local.youtube = googleapiclient.discovery.build(
+            api_service_name, api_version, developerKey=api_key)
+    return _local.youtube
+
+
+@functools.lru_cache(maxsize=None)
+def get_limiter() -> AdaptiveConcurrencyLimiter:
+    """
+    Returns the limiter shared by all Youtube API calls in this process. Its
+    `limit` and `stats()` show the current concurrency level.
+    """
+    return AdaptiveConcurrencyLimiter(**get_api_concurrency_config())
+
+
+def _is_transient(e: Exception) -> bool:
+    from googleapiclient.errors import HttpError
+
+    if isinstance(e, HttpError):
+        if e.resp.status in TRANSIENT_STATUSES:
+            return True
+        # Per-second rate limits come back as 403, unlike exhausted quota
+        return e.resp.status == 403 and any(
+            reason in str(e.content) for reason in RATE_LIMIT_REASONS)
+    return isinstance(e, (TimeoutError, ConnectionResetError))
+
+
+def _execute(request) -> Dict[str, Any]:
+    limiter = get_limiter()
+    try:
+        return retry_with_backoff(
+            lambda: limiter.call(request.execute,
+                                 # e.g. 'youtube.search.list'
+                                 request_type=getattr(request, 'methodId', None),
+                                 is_overload=_is_transient),
+            _is_transient,
+            max_retries=get_api_max_retries()
+        )
+    except Exception as e:
+        if _is_transient(e):
+            raise TransientAPIError(repr(e)) from e
+        raise
 
 
 def query_playlist_videos(playlist_id: str, max_results: int = 30) -> Dict[str, Any]:
     """
     Give the playlist ID, return the API response which contains the response
     """
-    youtube = googleapiclient.discovery.build(
-        API_SERVICE_NAME, API_VERSION, developerKey=API_KEY)
+    youtube = _get_youtube()
 
     request = youtube.playlistItems().list(
         part="snippet",
         playlistId=playlist_id,
         maxResults=max_results
     )
-    response = request.execute()
+    response = _execute(request)
 
     if ('items' not in response) or (not response['items']):
         raise ConnectionError
@@ -39,14 +106,13 @@ def query_videos(video_ids: List[str]) -> Dict[str, Any]:
     Give the video ID, return the API response which contains more video
     information
     """
-    youtube = googleapiclient.discovery.build(
-        API_SERVICE_NAME, API_VERSION, developerKey=API_KEY)
+    youtube = _get_youtube()
 
     request = youtube.videos().list(
         part="snippet,contentDetails",
         id=",".join(video_ids)
     )
-    response = request.execute()
+    response = _execute(request)
 
     if ('items' not in response) or (not response['items']):
         raise ConnectionError
@@ -59,14 +125,13 @@ def query_channel_details(channel_handle: str) -> Dict[str, Any]:
     Give the channel handle, return the API response which contains more
     information, particularly the channel ID.
     """
-    youtube = googleapiclient.discovery.build(
-        API_SERVICE_NAME, API_VERSION, developerKey=API_KEY)
+    youtube = _get_youtube()
 
     request = youtube.channels().list(
         part="snippet,id,statistics",
         forHandle=channel_handle
     )
-    response = request.execute()
+    response = _execute(request)
 
     if ('items' not in response) or (not response['items']):
         raise ConnectionError
@@ -74,21 +139,22 @@ def query_channel_details(channel_handle: str) -> Dict[str, Any]:
     return response
 
 
-def query_channel_videos(channel_id: str, max_results: int = 30):
+def query_channel_videos(channel_id: str, max_results: int = 30, page_token: str = None):
     """
     Give the channel ID, return the API response which contains a list of
-    uploaded videos and livestreams
+    uploaded videos and livestreams. The response contains `nextPageToken` if
+    there are more pages.
     """
-    youtube = googleapiclient.discovery.build(
-        API_SERVICE_NAME, API_VERSION, developerKey=API_KEY)
+    youtube = _get_youtube()
 
     request = youtube.search().list(
         part="snippet",
         channelId=channel_id,
         maxResults=max_results,
-        order="date"
+        order="date",
+        pageToken=page_token
     )
-    response = request.execute()
+    response = _execute(request)
 
     if ('items' not in response) or (not response['items']):
         raise ConnectionError